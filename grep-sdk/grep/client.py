@@ -4,18 +4,133 @@ Grep Client - Main SDK interface
 This wraps Traceloop SDK but presents it as "Grep" to customers.
 """
 
+import atexit
 import os
-from typing import Optional
+import threading
+from typing import Dict, Optional
 import warnings
 
-# We use Traceloop under the hood, but customer never sees this
-try:
-    from traceloop.sdk import Traceloop
-except ImportError:
-    raise ImportError(
-        "Grep SDK requires traceloop-sdk. Install it with:\n"
-        "pip install traceloop-sdk>=0.49.2"
-    )
+# We use Traceloop under the hood, but customer never sees this.
+# Imported lazily: pulling in traceloop loads every instrumentor, which
+# processes that only `import grep` (test collection, CLIs) don't need.
+_Traceloop = None
+
+
+def _get_traceloop():
+    """Import and return the Traceloop class on first use"""
+    global _Traceloop
+    if _Traceloop is None:
+        try:
+            from traceloop.sdk import Traceloop
+        except ImportError:
+            raise ImportError(
+                "Grep SDK requires traceloop-sdk. Install it with:\n"
+                "pip install traceloop-sdk>=0.49.2"
+            )
+        _Traceloop = Traceloop
+    return _Traceloop
+
+
+# OpenTelemetry's own BatchSpanProcessor defaults
+_OTEL_BSP_DEFAULTS: Dict[str, int] = {
+    "max_queue_size": 2048,
+    "schedule_delay_millis": 5000,
+    "max_export_batch_size": 512,
+    "export_timeout_millis": 30000,
+}
+
+# Where Grep's collector-friendly defaults differ from OTel's. Only these are
+# written (via os.environ.setdefault) so child processes inherit as little
+# as possible.
+_BATCH_DEFAULTS: Dict[str, int] = {
+    "schedule_delay_millis": 1000,
+}
+
+_BATCH_ENV_VARS: Dict[str, str] = {
+    "max_queue_size": "OTEL_BSP_MAX_QUEUE_SIZE",
+    "schedule_delay_millis": "OTEL_BSP_SCHEDULE_DELAY",
+    "max_export_batch_size": "OTEL_BSP_MAX_EXPORT_BATCH_SIZE",
+    "export_timeout_millis": "OTEL_BSP_EXPORT_TIMEOUT",
+}
+
+
+def _effective_batch_value(key: str, batch_config: dict) -> int:
+    """The value OTel will end up using for a batch setting"""
+    if key in batch_config:
+        return batch_config[key]
+    try:
+        return int(os.environ[_BATCH_ENV_VARS[key]])
+    except (KeyError, ValueError):
+        return _BATCH_DEFAULTS.get(key, _OTEL_BSP_DEFAULTS[key])
+
+
+def _batch_env_overrides(batch_config: Optional[dict]) -> Dict[str, str]:
+    """Validate batch_config and map it to OTEL_BSP_* env var values"""
+    batch_config = batch_config or {}
+    
+    unknown = set(batch_config) - set(_BATCH_ENV_VARS)
+    if unknown:
+        raise ValueError(
+            f"Unknown batch_config keys: {', '.join(sorted(unknown))}\n"
+            f"Supported keys: {', '.join(_BATCH_ENV_VARS)}"
+        )
+    
+    overrides = {}
+    for key, value in batch_config.items():
+        # bool is an int subclass, but True/False is never a meaningful size
+        if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+            raise ValueError(
+                f"batch_config['{key}'] must be a positive integer, got {value!r}"
+            )
+        overrides[_BATCH_ENV_VARS[key]] = str(value)
+    
+    # BatchSpanProcessor rejects this combination inside Traceloop.init, where
+    # it would surface as a misleading connection warning; catch it up front
+    batch_size = _effective_batch_value("max_export_batch_size", batch_config)
+    queue_size = _effective_batch_value("max_queue_size", batch_config)
+    if batch_size > queue_size:
+        raise ValueError(
+            f"max_export_batch_size ({batch_size}) must be less than or equal to "
+            f"max_queue_size ({queue_size})"
+        )
+    return overrides
+
+
+# Env vars Traceloop.init prefers over its api_endpoint/headers kwargs
+_TRACELOOP_OVERRIDE_ENV_VARS = ("TRACELOOP_BASE_URL", "TRACELOOP_HEADERS")
+
+# OTel context key Traceloop stores association properties under
+_ASSOCIATION_PROPERTIES_KEY = "association_properties"
+
+
+# GREP_* env values read so far. Only hits are cached, so a variable set
+# after a failed init() is still picked up on the next call.
+_env_cache: Dict[str, str] = {}
+
+
+def _cached_getenv(name: str) -> Optional[str]:
+    """Read an environment variable once and reuse it for the process lifetime"""
+    value = _env_cache.get(name)
+    if value is None:
+        value = os.getenv(name)
+        if value is not None:
+            _env_cache[name] = value
+    return value
+
+
+def _echo(message: str):
+    """Print a status message in a single write, unless GREP_QUIET=1"""
+    if _cached_getenv("GREP_QUIET") == "1":
+        return
+    # print() (unlike sys.stdout.write) is a no-op when sys.stdout is None,
+    # e.g. under pythonw or some daemonized runtimes
+    print(message, end="")
+
+
+def _setenv_if_changed(key: str, value: str):
+    """Write to os.environ only if the value differs (skips a redundant putenv)"""
+    if os.environ.get(key) != value:
+        os.environ[key] = value
 
 
 class Grep:
@@ -40,6 +155,10 @@ class Grep:
     _initialized = False
     _api_key: Optional[str] = None
     _collector_endpoint: Optional[str] = None
+    _api_key_display: Optional[str] = None
+    _init_lock = threading.Lock()
+    _atexit_registered = False
+    _shut_down = False
     
     @classmethod
     def init(
@@ -48,6 +167,7 @@ class Grep:
         collector_endpoint: Optional[str] = None,
         disable_batch: bool = False,
         app_name: Optional[str] = None,
+        batch_config: Optional[dict] = None,
     ):
         """
         Initialize Grep telemetry
@@ -60,13 +180,27 @@ class Grep:
                                      Default: http://localhost:8000 (for testing)
                                      Production: https://collector.grep.com
             
-            disable_batch (bool): If True, sends traces immediately (useful for testing)
+            disable_batch (bool): If True, sends traces immediately (local debugging only)
                                  Default: False (batches for efficiency)
+                                 Sending one request per span does not scale in production.
             
             app_name (str): Optional name to identify your application in traces
+            
+            batch_config (dict): Optional overrides for span batching. Supported keys:
+                                max_queue_size (default 2048),
+                                schedule_delay_millis (default 1000),
+                                max_export_batch_size (default 512),
+                                export_timeout_millis (default 30000)
+                                Values must be positive integers, and
+                                max_export_batch_size <= max_queue_size.
+                                Applied as OTEL_BSP_* env vars, which child
+                                processes inherit.
         
         Raises:
-            ValueError: If API key is missing or invalid format
+            ValueError: If API key is missing or invalid format,
+                        or batch_config has an unknown key, a non-integer value,
+                        or a batch size larger than the queue size
+            RuntimeError: If Grep.shutdown() was already called in this process
         
         Example:
             # Basic usage
@@ -85,70 +219,120 @@ class Grep:
             )
         """
         
+        # Lock-free fast path; re-checked under the lock below
         if cls._initialized:
             warnings.warn("⚠️  Grep is already initialized. Skipping re-initialization.")
             return
         
-        # Step 1: Get API key (from parameter or environment)
-        cls._api_key = api_key or os.getenv("GREP_API_KEY")
-        
-        if not cls._api_key:
-            raise ValueError(
-                "Grep API key is required!\n\n"
-                "Provide it in one of two ways:\n"
-                "  1. Pass as parameter: Grep.init(api_key='grep_xxxxx')\n"
-                "  2. Set environment variable: export GREP_API_KEY='grep_xxxxx'\n\n"
-                "Get your API key at: http://localhost:3000/settings/api-keys\n"
-                "(Production: https://app.grep.com/settings/api-keys)"
-            )
-        
-        # Step 2: Validate API key format
-        if not cls._api_key.startswith("grep_"):
-            raise ValueError(
-                "Invalid Grep API key format!\n"
-                "API keys should start with 'grep_'\n"
-                f"Your key starts with: {cls._api_key[:10]}..."
-            )
-        
-        # Step 3: Set collector endpoint
-        if not collector_endpoint:
-            # Default to localhost for testing
-            # In production, this would be your deployed backend
-            collector_endpoint = os.getenv(
-                "GREP_COLLECTOR_ENDPOINT",
-                "http://localhost:8000"  # Your Grep backend
-            )
-        
-        cls._collector_endpoint = collector_endpoint
-        
-        # Step 4: Configure Traceloop to use OUR backend (not Traceloop directly)
-        # We set these env vars so Traceloop sends to OUR proxy, not theirs
-        os.environ["TRACELOOP_BASE_URL"] = collector_endpoint
-        os.environ["TRACELOOP_HEADERS"] = f"authorization=Bearer {cls._api_key}"
-        
-        # Step 5: Initialize underlying Traceloop SDK
-        try:
-            Traceloop.init(
-                app_name=app_name or "grep-app",
-                disable_batch=disable_batch,
-                api_endpoint=f"{collector_endpoint}/v1/traces",
-            )
-        except Exception as e:
-            # Don't fail initialization if backend isn't running yet
-            # This allows testing the SDK without backend
-            warnings.warn(
-                f"Could not connect to Grep collector: {str(e)}\n"
-                f"Traces will be sent when collector is available at: {collector_endpoint}"
+        with cls._init_lock:
+            if cls._initialized:
+                warnings.warn("⚠️  Grep is already initialized. Skipping re-initialization.")
+                return
+            
+            if cls._shut_down:
+                raise RuntimeError(
+                    "Grep cannot be re-initialized after Grep.shutdown().\n"
+                    "The tracer provider has been stopped for this process; "
+                    "use Grep.flush() if you only need to export pending traces."
+                )
+            
+            # Resolve Traceloop and validate batch_config first so a failure
+            # leaves no partial state
+            Traceloop = _get_traceloop()
+            batch_overrides = _batch_env_overrides(batch_config)
+            
+            # Step 1: Get API key (from parameter or environment)
+            resolved_key = api_key or _cached_getenv("GREP_API_KEY")
+            
+            if not resolved_key:
+                raise ValueError(
+                    "Grep API key is required!\n\n"
+                    "Provide it in one of two ways:\n"
+                    "  1. Pass as parameter: Grep.init(api_key='grep_xxxxx')\n"
+                    "  2. Set environment variable: export GREP_API_KEY='grep_xxxxx'\n\n"
+                    "Get your API key at: http://localhost:3000/settings/api-keys\n"
+                    "(Production: https://app.grep.com/settings/api-keys)"
+                )
+            
+            # Step 2: Validate API key format
+            if resolved_key[:5] != "grep_":
+                raise ValueError(
+                    "Invalid Grep API key format!\n"
+                    "API keys should start with 'grep_'\n"
+                    f"Your key starts with: {resolved_key[:10]}..."
+                )
+            cls._api_key = resolved_key
+            cls._api_key_display = resolved_key[:15] + "..."
+            
+            # Step 3: Set collector endpoint
+            if not collector_endpoint:
+                # Default to localhost for testing
+                # In production, this would be your deployed backend
+                collector_endpoint = (
+                    _cached_getenv("GREP_COLLECTOR_ENDPOINT")
+                    or "http://localhost:8000"  # Your Grep backend
+                )
+            
+            cls._collector_endpoint = collector_endpoint
+            
+            # Built locally so the full key isn't kept on the class a second time
+            auth_header = f"Bearer {cls._api_key}"
+            
+            # Step 4: Configure span batching
+            if disable_batch:
+                warnings.warn(
+                    "disable_batch=True is for local debugging; do not use in production"
+                )
+            else:
+                # Process-wide env vars, so child processes inherit them too
+                for key, env_var in _BATCH_ENV_VARS.items():
+                    if env_var in batch_overrides:
+                        _setenv_if_changed(env_var, batch_overrides[env_var])
+                    elif key in _BATCH_DEFAULTS:
+                        os.environ.setdefault(env_var, str(_BATCH_DEFAULTS[key]))
+            
+            # Step 5: Configure Traceloop to use OUR backend (not Traceloop directly)
+            # Endpoint and headers are passed as kwargs so we don't mutate the
+            # process (and children's) env. Traceloop lets these env vars win
+            # over the kwargs, so a leftover Traceloop config would silently
+            # send Grep traces elsewhere without the Grep API key.
+            conflicting = [
+                name for name in _TRACELOOP_OVERRIDE_ENV_VARS if os.getenv(name)
+            ]
+            if conflicting:
+                warnings.warn(
+                    f"Environment overrides Grep's collector settings ({', '.join(conflicting)}); "
+                    "traces may not reach Grep.\n"
+                    "Unset it to send traces to: " + collector_endpoint
+                )
+            
+            # Step 6: Initialize underlying Traceloop SDK
+            try:
+                Traceloop.init(
+                    app_name=app_name or "grep-app",
+                    disable_batch=disable_batch,
+                    # Base URL only: Traceloop's exporter appends /v1/traces itself
+                    api_endpoint=collector_endpoint,
+                    headers={"authorization": auth_header},
+                )
+            except Exception as e:
+                # Don't fail initialization if backend isn't running yet
+                # This allows testing the SDK without backend
+                warnings.warn(
+                    f"Could not connect to Grep collector: {str(e)}\n"
+                    f"Traces will be sent when collector is available at: {collector_endpoint}"
+                )
+            
+            cls._initialized = True
+            
+            # Success message (single write; set GREP_QUIET=1 to suppress)
+            _echo(
+                "✅ Grep initialized successfully!\n"
+                f"📊 Collector: {collector_endpoint}\n"
+                f"🔑 API Key: {cls._api_key_display}\n"
+                "📈 View traces: http://localhost:3000/traces\n"
+                "    (Production: https://app.grep.com/traces)\n"
             )
-        
-        cls._initialized = True
-        
-        # Success message
-        print("✅ Grep initialized successfully!")
-        print(f"📊 Collector: {collector_endpoint}")
-        print(f"🔑 API Key: {cls._api_key[:15]}...")
-        print(f"📈 View traces: http://localhost:3000/traces")
-        print("    (Production: https://app.grep.com/traces)")
     
     @classmethod
     def set_association_properties(cls, properties: dict):
@@ -172,15 +356,74 @@ class Grep:
                 "Grep not initialized! Call Grep.init() first."
             )
         
-        return Traceloop.set_association_properties(properties)
+        # Middleware often re-sets identical metadata on every request;
+        # skip the forward when the active OTel context already carries it.
+        # Checking the context itself (not a cache of our own) means a
+        # detached workflow/span context is never mistaken for "unchanged".
+        from opentelemetry import context
+        
+        if context.get_value(_ASSOCIATION_PROPERTIES_KEY) == properties:
+            return None
+        
+        # Forward a shallow copy so later mutation of the caller's dict can't
+        # make the stored value look up to date (Traceloop only reads the
+        # top-level values)
+        return _get_traceloop().set_association_properties(dict(properties))
+    
+    @classmethod
+    def flush(cls, timeout_millis: int = 5000) -> bool:
+        """
+        Export any pending traces without shutting down
+        
+        Args:
+            timeout_millis (int): Maximum time to wait for the export
+        
+        Returns:
+            bool: True if all pending spans were exported in time
+        
+        Example:
+            Grep.flush()
+        """
+        if not cls._initialized:
+            return True
+        
+        from opentelemetry import trace
+        
+        provider = trace.get_tracer_provider()
+        force_flush = getattr(provider, "force_flush", None)
+        if force_flush is None:
+            # No SDK tracer provider installed, nothing is buffered
+            return True
+        return force_flush(timeout_millis=timeout_millis)
+    
+    @classmethod
+    def enable_atexit_flush(cls):
+        """
+        Flush pending traces automatically when the process exits
+        
+        Safe to call more than once; the hook is registered only once.
+        
+        Example:
+            Grep.init(api_key="grep_xxxxx")
+            Grep.enable_atexit_flush()
+        """
+        if cls._atexit_registered:
+            return
+        atexit.register(cls.flush)
+        cls._atexit_registered = True
     
     @classmethod
-    def shutdown(cls):
+    def shutdown(cls, timeout_millis: int = 5000):
         """
         Gracefully shutdown Grep telemetry
         
-        Flushes any pending traces before shutting down.
-        Call this before your application exits.
+        Flushes any pending traces, then stops the tracer provider.
+        Call this once, right before your application exits: Grep.init()
+        raises RuntimeError afterwards. Use Grep.flush() to export pending
+        traces while the app keeps running.
+        
+        Args:
+            timeout_millis (int): Maximum time to wait for the final flush
         
         Example:
             import atexit
@@ -190,14 +433,30 @@ class Grep:
             return
         
         try:
-            # Flush any pending traces
-            # Note: Traceloop doesn't have explicit shutdown in current version
-            # but we'll implement graceful handling
-            print("👋 Grep shutdown initiated...")
-            cls._initialized = False
-            print("✅ Grep shutdown complete")
+            _echo("👋 Grep shutdown initiated...\n")
+            cls.flush(timeout_millis)
+            
+            # Stop the span processors. Traceloop and OTel only allow one
+            # tracer provider per process, so this is final (see init()).
+            from opentelemetry import trace
+            
+            provider = trace.get_tracer_provider()
+            if hasattr(provider, "shutdown"):
+                provider.shutdown()
         except Exception as e:
-            print(f"⚠️  Error during Grep shutdown: {e}")
+            # Provider may still be running: stay initialized so flush()
+            # keeps working and shutdown() can be retried
+            _echo(f"⚠️  Error during Grep shutdown: {e}\n")
+            return
+        
+        with cls._init_lock:
+            cls._initialized = False
+            cls._shut_down = True
+            # Not needed for re-init (there is none); just don't keep the
+            # secret around once telemetry is stopped
+            cls._api_key = None
+            cls._api_key_display = None
+        _echo("✅ Grep shutdown complete\n")
     
     @classmethod
     def is_initialized(cls) -> bool:
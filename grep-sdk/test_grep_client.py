@@ -0,0 +1,339 @@
+"""
+Unit tests for Grep client behavior
+
+Traceloop is replaced with a fake so no instrumentors are installed and no
+collector is needed. Run with: pytest test_grep_client.py
+"""
+
+import contextvars
+import sys
+import threading
+import time
+
+import pytest
+
+from grep import Grep
+from grep import client
+
+TEST_KEY = "grep_testorg_abc123demo"
+
+OTEL_BSP_VARS = (
+    "OTEL_BSP_MAX_QUEUE_SIZE",
+    "OTEL_BSP_SCHEDULE_DELAY",
+    "OTEL_BSP_MAX_EXPORT_BATCH_SIZE",
+    "OTEL_BSP_EXPORT_TIMEOUT",
+)
+
+
+class FakeTraceloop:
+    """Records calls the way the real Traceloop would receive them"""
+
+    init_calls = []
+    association_calls = []
+    init_delay = 0.0
+
+    @classmethod
+    def init(cls, **kwargs):
+        time.sleep(cls.init_delay)
+        cls.init_calls.append(kwargs)
+
+    @classmethod
+    def set_association_properties(cls, properties):
+        # Mirror traceloop.sdk.tracing.set_association_properties
+        from opentelemetry.context import attach, set_value
+
+        cls.association_calls.append(properties)
+        attach(set_value("association_properties", properties))
+
+
+class FakeProvider:
+    """Stands in for the global OTel SDK TracerProvider"""
+
+    def __init__(self, fail_shutdown=False):
+        self.calls = []
+        self.fail_shutdown = fail_shutdown
+
+    def force_flush(self, timeout_millis):
+        self.calls.append(("force_flush", timeout_millis))
+        return True
+
+    def shutdown(self):
+        self.calls.append("shutdown")
+        if self.fail_shutdown:
+            raise RuntimeError("exporter stuck")
+
+
+@pytest.fixture(autouse=True)
+def fresh_grep(monkeypatch):
+    """Give every test an uninitialized Grep backed by FakeTraceloop"""
+    monkeypatch.setattr(client, "_Traceloop", FakeTraceloop)
+    monkeypatch.setattr(client, "_env_cache", {})
+    for attr, value in [
+        ("_initialized", False),
+        ("_shut_down", False),
+        ("_api_key", None),
+        ("_api_key_display", None),
+        ("_collector_endpoint", None),
+        ("_atexit_registered", False),
+    ]:
+        monkeypatch.setattr(Grep, attr, value)
+
+    FakeTraceloop.init_calls = []
+    FakeTraceloop.association_calls = []
+    FakeTraceloop.init_delay = 0.0
+
+    monkeypatch.setenv("GREP_QUIET", "1")
+    for name in ("GREP_API_KEY", "GREP_COLLECTOR_ENDPOINT",
+                 "TRACELOOP_BASE_URL", "TRACELOOP_HEADERS") + OTEL_BSP_VARS:
+        monkeypatch.delenv(name, raising=False)
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    trace = pytest.importorskip("opentelemetry.trace")
+    fake = FakeProvider()
+    monkeypatch.setattr(trace, "get_tracer_provider", lambda: fake)
+    return fake
+
+
+# --- init ---
+
+def test_init_passes_collector_and_headers_to_traceloop():
+    Grep.init(api_key=TEST_KEY, collector_endpoint="http://c:8000")
+
+    assert Grep.is_initialized()
+    assert FakeTraceloop.init_calls == [{
+        "app_name": "grep-app",
+        "disable_batch": False,
+        "api_endpoint": "http://c:8000",
+        "headers": {"authorization": f"Bearer {TEST_KEY}"},
+    }]
+
+
+def test_init_reads_key_set_after_failed_init(monkeypatch):
+    with pytest.raises(ValueError, match="API key is required"):
+        Grep.init()
+
+    monkeypatch.setenv("GREP_API_KEY", TEST_KEY)
+    Grep.init()
+
+    assert Grep.is_initialized()
+
+
+def test_invalid_key_leaves_no_state():
+    with pytest.raises(ValueError, match="should start with 'grep_'"):
+        Grep.init(api_key="sk_not_a_grep_key")
+
+    assert not Grep.is_initialized()
+    assert Grep._api_key is None
+    assert Grep.get_collector_endpoint() is None
+
+
+def test_second_init_warns_and_skips():
+    Grep.init(api_key=TEST_KEY)
+
+    with pytest.warns(UserWarning, match="already initialized"):
+        Grep.init(api_key=TEST_KEY)
+
+    assert len(FakeTraceloop.init_calls) == 1
+
+
+def test_concurrent_init_runs_traceloop_once():
+    FakeTraceloop.init_delay = 0.05
+    threads = [
+        threading.Thread(target=Grep.init, kwargs={"api_key": TEST_KEY})
+        for _ in range(8)
+    ]
+
+    with pytest.warns(UserWarning, match="already initialized"):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert len(FakeTraceloop.init_calls) == 1
+
+
+def test_init_survives_missing_stdout(monkeypatch):
+    monkeypatch.delenv("GREP_QUIET")
+    monkeypatch.setattr(sys, "stdout", None)
+
+    Grep.init(api_key=TEST_KEY)
+
+    assert Grep.is_initialized()
+
+
+def test_init_warns_when_traceloop_env_overrides_collector(monkeypatch):
+    monkeypatch.setenv("TRACELOOP_BASE_URL", "https://api.traceloop.com")
+
+    with pytest.warns(UserWarning, match="TRACELOOP_BASE_URL"):
+        Grep.init(api_key=TEST_KEY)
+
+
+# --- batching ---
+
+def test_default_batching_only_sets_schedule_delay(monkeypatch):
+    monkeypatch.setenv("OTEL_BSP_MAX_QUEUE_SIZE", "4096")
+
+    Grep.init(api_key=TEST_KEY)
+
+    assert client.os.environ["OTEL_BSP_SCHEDULE_DELAY"] == "1000"
+    assert client.os.environ["OTEL_BSP_MAX_QUEUE_SIZE"] == "4096"
+    assert "OTEL_BSP_MAX_EXPORT_BATCH_SIZE" not in client.os.environ
+    assert "OTEL_BSP_EXPORT_TIMEOUT" not in client.os.environ
+
+
+def test_batch_config_overrides_env():
+    Grep.init(api_key=TEST_KEY, batch_config={"max_export_batch_size": 256})
+
+    assert client.os.environ["OTEL_BSP_MAX_EXPORT_BATCH_SIZE"] == "256"
+
+
+@pytest.mark.parametrize("batch_config, disable_batch, message", [
+    ({"max_queue": 10}, False, "Unknown batch_config keys"),
+    ({"max_queue": 10}, True, "Unknown batch_config keys"),
+    ({"max_queue_size": "2048"}, False, "must be a positive integer"),
+    ({"max_queue_size": True}, False, "must be a positive integer"),
+    ({"max_queue_size": 0}, False, "must be a positive integer"),
+    ({"max_export_batch_size": 4096}, False, "less than or equal to max_queue_size"),
+])
+def test_invalid_batch_config_rejected_before_any_state(batch_config, disable_batch, message):
+    with pytest.raises(ValueError, match=message):
+        Grep.init(
+            api_key=TEST_KEY,
+            batch_config=batch_config,
+            disable_batch=disable_batch,
+        )
+
+    assert not Grep.is_initialized()
+    assert Grep._api_key is None
+    assert Grep.get_collector_endpoint() is None
+    assert FakeTraceloop.init_calls == []
+    for name in OTEL_BSP_VARS:
+        assert name not in client.os.environ
+
+
+def test_batch_size_checked_against_existing_queue_env(monkeypatch):
+    monkeypatch.setenv("OTEL_BSP_MAX_QUEUE_SIZE", "100")
+
+    with pytest.raises(ValueError, match=r"\(512\).*\(100\)"):
+        Grep.init(api_key=TEST_KEY)
+
+
+def test_disable_batch_warns_and_skips_bsp_env():
+    with pytest.warns(UserWarning, match="disable_batch=True is for local debugging"):
+        Grep.init(api_key=TEST_KEY, disable_batch=True)
+
+    assert FakeTraceloop.init_calls[0]["disable_batch"] is True
+    for name in OTEL_BSP_VARS:
+        assert name not in client.os.environ
+
+
+# --- flush / shutdown ---
+
+def test_flush_before_init_is_noop():
+    assert Grep.flush() is True
+
+
+def test_flush_forces_provider_flush(provider):
+    Grep.init(api_key=TEST_KEY)
+
+    assert Grep.flush(timeout_millis=1234) is True
+    assert provider.calls == [("force_flush", 1234)]
+    assert Grep.is_initialized()
+
+
+def test_enable_atexit_flush_registers_once(monkeypatch):
+    registered = []
+    monkeypatch.setattr(client.atexit, "register", registered.append)
+
+    Grep.enable_atexit_flush()
+    Grep.enable_atexit_flush()
+
+    assert registered == [Grep.flush]
+
+
+def test_shutdown_flushes_then_stops_provider(provider):
+    Grep.init(api_key=TEST_KEY)
+
+    Grep.shutdown(timeout_millis=1000)
+
+    assert provider.calls == [("force_flush", 1000), "shutdown"]
+    assert not Grep.is_initialized()
+    assert Grep._api_key is None
+    assert Grep._api_key_display is None
+
+
+def test_init_after_shutdown_raises(provider):
+    Grep.init(api_key=TEST_KEY)
+    Grep.shutdown()
+
+    with pytest.raises(RuntimeError, match="after Grep.shutdown"):
+        Grep.init(api_key=TEST_KEY)
+
+
+def test_failed_shutdown_stays_initialized(provider):
+    provider.fail_shutdown = True
+    Grep.init(api_key=TEST_KEY)
+
+    Grep.shutdown()
+
+    assert Grep.is_initialized()
+    assert not Grep._shut_down
+
+
+# --- association properties ---
+
+def test_set_association_properties_requires_init():
+    with pytest.raises(RuntimeError, match="not initialized"):
+        Grep.set_association_properties({"user_id": "u1"})
+
+
+def _in_fresh_context(func):
+    """Run func in a copied context so attached OTel values don't leak"""
+    return contextvars.copy_context().run(func)
+
+
+def test_identical_association_properties_skipped():
+    pytest.importorskip("opentelemetry.context")
+    Grep.init(api_key=TEST_KEY)
+
+    def body():
+        Grep.set_association_properties({"user_id": "u1"})
+        Grep.set_association_properties({"user_id": "u1"})
+        Grep.set_association_properties({"user_id": "u2"})
+
+    _in_fresh_context(body)
+
+    assert FakeTraceloop.association_calls == [{"user_id": "u1"}, {"user_id": "u2"}]
+
+
+def test_mutated_association_properties_forwarded():
+    pytest.importorskip("opentelemetry.context")
+    Grep.init(api_key=TEST_KEY)
+
+    def body():
+        properties = {"user_id": "u1"}
+        Grep.set_association_properties(properties)
+        properties["user_id"] = "u2"
+        Grep.set_association_properties(properties)
+
+    _in_fresh_context(body)
+
+    assert FakeTraceloop.association_calls == [{"user_id": "u1"}, {"user_id": "u2"}]
+
+
+def test_association_properties_forwarded_again_after_context_detach():
+    context = pytest.importorskip("opentelemetry.context")
+    Grep.init(api_key=TEST_KEY)
+
+    def body():
+        # Like a workflow span: attach, set properties, then detach on exit
+        token = context.attach(context.set_value("workflow_name", "wf"))
+        Grep.set_association_properties({"user_id": "u1"})
+        context.detach(token)
+        Grep.set_association_properties({"user_id": "u1"})
+
+    _in_fresh_context(body)
+
+    assert len(FakeTraceloop.association_calls) == 2
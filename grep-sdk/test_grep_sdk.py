@@ -5,6 +5,7 @@ This tests basic initialization without connecting to backend.
 """
 
 import os
+import warnings
 from grep import Grep
 
 print("🧪 Testing Grep SDK...")
@@ -14,7 +15,15 @@ print("-" * 50)
 print("\n1️⃣ Testing initialization with API key...")
 try:
     os.environ["GREP_API_KEY"] = "grep_testorg_abc123demo"
-    Grep.init(disable_batch=True)
+    # disable_batch=True is deliberate for this local smoke test; Grep warns
+    # that it isn't meant for production, so check for that warning here
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        Grep.init(disable_batch=True)
+    if any("disable_batch" in str(w.message) for w in caught):
+        print("✅ disable_batch warning emitted")
+    else:
+        print("❌ Expected a disable_batch warning")
     print("✅ SDK initialized successfully!\n")
 except Exception as e:
     print(f"❌ Failed: {e}\n")